@@ -0,0 +1,16 @@
+# Gunicorn configuration for production (used by the Procfile)
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# UvicornWorker picks uvloop and httptools automatically; both ship with uvicorn[standard]
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Small fixed default: cpu_count() sees the host's CPUs rather than the container's
+# quota, and every worker loads its own torch + embedding model and runs up to
+# PPLX_CONCURRENCY Perplexity calls. Scale with WEB_CONCURRENCY (see Procfile).
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_connections = 1000
+
+# Longer than the 5 minute Perplexity client timeout so slow analyses aren't killed
+timeout = 400
+keepalive = 75
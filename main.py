@@ -1,14 +1,24 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 import asyncio
 import aiohttp
+import aiosqlite
+import hashlib
 import json
+import orjson
+import re
+import time
+import uuid
 from datetime import datetime, timedelta
 import logging
 import os
 from dataclasses import dataclass
+import sqlite_vec
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from sentence_transformers import SentenceTransformer
 
 # Configure logging for production
 logging.basicConfig(
@@ -22,7 +32,8 @@ app = FastAPI(
     version="1.0.0",
     description="AI-powered comprehensive mutual fund analysis platform",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware for frontend integration
@@ -37,10 +48,209 @@ app.add_middleware(
 # Configuration - Use environment variables in production
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY", "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")
 PERPLEXITY_BASE_URL = "https://api.perplexity.ai/chat/completions"
+PERPLEXITY_MODEL = "sonar"
+PERPLEXITY_CONCURRENCY = int(os.getenv("PPLX_CONCURRENCY", "8"))  # in-flight calls per worker
+
+# Response cache configuration
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache.db")
+FUND_CACHE_TTL = 6 * 60 * 60  # 6 hours for fund/sentiment analysis
+MACRO_CACHE_TTL = 60 * 60  # 1 hour for macroeconomic analysis
+RESPONSE_CACHE_RETENTION = max(FUND_CACHE_TTL, MACRO_CACHE_TTL)  # rows older than every TTL are pruned
+
+# Semantic cache configuration - bump CACHE_VERSION when prompts change
+CACHE_VERSION = "3"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+SEMANTIC_CACHE_TTL = 24 * 60 * 60  # 24 hours
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", "0.07"))  # cosine similarity > 0.93
+TASK_RETENTION = 24 * 60 * 60  # keep background task results for a day
+
+# Messages returned in place of an analysis when a Perplexity call fails
+API_ERROR_MESSAGE = "Error calling Perplexity API: {status}. Please try again."
+TIMEOUT_MESSAGE = "Request timeout. Please try again with a shorter fund name."
+UNAVAILABLE_MESSAGE = "Service temporarily unavailable. Please try again later."
+_FAILURE_PREFIXES = (API_ERROR_MESSAGE.split("{")[0], TIMEOUT_MESSAGE, UNAVAILABLE_MESSAGE)
+
+# Agent instructions - static text goes in the system message and the fund name
+# comes last in the user message, so the provider's prompt-prefix cache is reused
+FUND_ANALYSIS_INSTRUCTIONS = """You are an expert analyst of Indian mutual funds. Analyze the fund named by the user:
+- Overview: AUM, expense ratio, fund manager, investment style
+- Returns: 1Y/3Y/5Y vs benchmark and category
+- Portfolio: top holdings, sector and market-cap mix
+- Risk: beta, standard deviation, Sharpe ratio
+- Fund manager track record
+- Strengths, weaknesses, suitable investor profiles
+Use specific recent figures (last 12 months). Respond in at most 600 words."""
+
+SENTIMENT_ANALYSIS_INSTRUCTIONS = """You are a financial sentiment analyst. Assess current sentiment around the mutual fund named by the user:
+- News and press releases (last 4 weeks)
+- Analyst and expert commentary
+- Social and investor sentiment trends
+- Significant events affecting the fund or its holdings
+Give an overall sentiment score and direction, key positive/negative catalysts and forward-looking indicators.
+Cite credible financial sources. Respond in at most 600 words."""
+
+MACRO_ANALYSIS_INSTRUCTIONS = """You are a macroeconomic analyst. Explain how current Indian and global conditions affect the mutual fund named by the user:
+- GDP growth, RBI policy and rate outlook, CPI/WPI inflation
+- Global factors, INR/USD and FII flows
+- Government and SEBI policy for capital markets
+- Sector trends relevant to the fund's holdings
+Give key risks and opportunities, specific implications for the fund and likely scenarios.
+Use recent data and RBI/government announcements. Respond in at most 600 words."""
+
+REPORT_STRUCTURE = """Write a professional research report in Markdown with these sections:
+
+# Investment Research Report: <fund name>
+## Executive Summary - key findings, recommendation, target investor, risk rating
+## Fund Overview - details and strategy
+## Performance Analysis - historical and risk-adjusted returns
+## Current Market Environment - macro backdrop and sentiment
+## Investment Thesis - strengths/opportunities, risks/challenges
+## Final Recommendation - BUY/HOLD/SELL, rationale, suitable investor, horizon
+
+Be specific and actionable. Respond in at most 600 words."""
+
+REPORT_INSTRUCTIONS = (
+    "You are an investment research writer. Compile the fund, sentiment and macroeconomic analyses "
+    "provided by the user into one report on the named mutual fund.\n\n"
+    + REPORT_STRUCTURE
+)
+
+FUSED_ANALYSIS_INSTRUCTIONS = (
+    "Produce research on the Indian mutual fund named by the user as a single JSON object "
+    "with exactly these string fields, each written in Markdown.\n\n"
+    '"fund_analysis":\n' + FUND_ANALYSIS_INSTRUCTIONS + "\n\n"
+    '"sentiment_analysis":\n' + SENTIMENT_ANALYSIS_INSTRUCTIONS + "\n\n"
+    '"macro_analysis":\n' + MACRO_ANALYSIS_INSTRUCTIONS + "\n\n"
+    '"final_report":\nCombine the three analyses above into one report. '
+    + REPORT_STRUCTURE
+)
+
+# Output budgets - generation time and cost scale with tokens out
+SECTION_MAX_TOKENS = 900
+REPORT_MAX_TOKENS = 1200
+FUSED_MAX_TOKENS = 3 * SECTION_MAX_TOKENS + REPORT_MAX_TOKENS
+
+# User message templates - the variable part of each prompt, fund name last
+FUND_PROMPT = "Mutual fund: {fund_name}"
+
+REPORT_PROMPT = """FUND ANALYSIS:
+{fund_analysis}
+
+SENTIMENT ANALYSIS:
+{sentiment_analysis}
+
+MACROECONOMIC ANALYSIS:
+{macro_analysis}
+
+Mutual fund: {fund_name}"""
+
+# Structured output for the fused single-call analysis
+FUSED_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "schema": {
+            "type": "object",
+            "properties": {
+                "fund_analysis": {"type": "string"},
+                "sentiment_analysis": {"type": "string"},
+                "macro_analysis": {"type": "string"},
+                "final_report": {"type": "string"}
+            },
+            "required": ["fund_analysis", "sentiment_analysis", "macro_analysis", "final_report"]
+        }
+    }
+}
+_JSON_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+def parse_fused_analysis(content: str) -> Optional[Dict]:
+    """Sections of a fused JSON reply, or None if it is truncated or malformed"""
+    try:
+        sections = orjson.loads(_JSON_FENCE_RE.sub('', content.strip()))
+        return {
+            "fund_analysis": str(sections["fund_analysis"]),
+            "sentiment_analysis": str(sections["sentiment_analysis"]),
+            "macroeconomic_analysis": str(sections["macro_analysis"]),
+            "final_report": str(sections["final_report"])
+        }
+    except (ValueError, KeyError, TypeError):
+        return None
+
+# Filler words that don't change which scheme is meant
+_FILLER_WORDS_RE = re.compile(r'\b(plan|option)\b')
+# Plan (direct/regular) and option (growth/idcw) pick a different scheme, with its own NAV
+_VARIANT_WORDS_RE = re.compile(r'\b(direct|regular|growth|idcw)\b')
+# Old name of the IDCW option, but not the dividend yield fund category
+_DIVIDEND_RE = re.compile(r'\bdividend\b(?! yield)')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+# Preferred cached variant for names that don't give a plan/option (as split_fund_variant spells it)
+DEFAULT_FUND_VARIANT = "direct growth"
+
+def normalize_fund_name(fund_name: str) -> str:
+    """Lowercase, drop filler words, spell dividend as idcw and collapse whitespace"""
+    name = _NON_ALNUM_RE.sub(' ', fund_name.lower())
+    name = ' '.join(_FILLER_WORDS_RE.sub(' ', name).split())
+    return _DIVIDEND_RE.sub('idcw', name)
+
+def split_fund_variant(fund_name: str) -> tuple:
+    """Split a fund name into the normalized base fund and its plan/option, e.g. ("axis bluechip fund", "direct growth")"""
+    name = normalize_fund_name(fund_name)
+    variant = ' '.join(sorted(set(_VARIANT_WORDS_RE.findall(name))))
+    return ' '.join(_VARIANT_WORDS_RE.sub(' ', name).split()), variant
+
+def fund_category(fund_name: str) -> str:
+    """Group cache entries by fund house (first token of the normalized name, e.g. hdfc, sbi)"""
+    name = normalize_fund_name(fund_name)
+    return name.split(' ', 1)[0] if name else ""
+
+async def connect_cache_db(path: str):
+    """Open the cache database so several worker processes can share it"""
+    db = await aiosqlite.connect(path)
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA busy_timeout=5000")
+    return db
+
+async def ensure_column(db, table: str, column: str, declaration: str):
+    """Add a column to a cache table created by an older version"""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def is_failed_response(content: str) -> bool:
+    """Check whether a section holds an error message instead of an analysis"""
+    return content.startswith(_FAILURE_PREFIXES)
+
+class PerplexityAPIError(Exception):
+    """Perplexity returned a non-200 response"""
+
+    def __init__(self, status: int, error_text: str):
+        super().__init__(f"{status} - {error_text}")
+        self.status = status
+
+class RetryableAPIError(PerplexityAPIError):
+    """Rate limit (429) or server error (5xx) that is worth retrying"""
+
+class StreamInterruptedError(Exception):
+    """A streamed completion failed or ended before [DONE]; the message is shown in place of the section"""
+
+def raise_for_perplexity_status(status: int, error_text: str):
+    if status == 429 or status >= 500:
+        logger.warning(f"Perplexity API returned {status}, retrying")
+        raise RetryableAPIError(status, error_text)
+    raise PerplexityAPIError(status, error_text)
+
+# Exponential backoff with jitter for rate limits and server errors
+retry_on_rate_limit = retry(
+    wait=wait_exponential_jitter(1, 10),
+    stop=stop_after_attempt(4),
+    retry=retry_if_exception_type(RetryableAPIError),
+    reraise=True
+)
 
 # Request/Response Models
 class MutualFundRequest(BaseModel):
     mutual_fund_name: str
+    no_cache: bool = False
     
 class AnalysisResponse(BaseModel):
     status: str
@@ -61,15 +271,276 @@ class AnalysisResult:
     macro_analysis: str = ""
     final_report: str = ""
 
+class LLMCache:
+    """Persistent cache of Perplexity responses backed by SQLite"""
+
+    def __init__(self, path: str = CACHE_DB_PATH):
+        self.path = path
+        self.db = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._lock:
+            if self.db is None:
+                self.db = await connect_cache_db(self.path)
+                await self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS resp (key TEXT PRIMARY KEY, body TEXT, ts INTEGER, category TEXT)"
+                )
+                await ensure_column(self.db, "resp", "category", "TEXT")
+                await self.db.execute("CREATE INDEX IF NOT EXISTS resp_ts ON resp (ts)")
+                await self.db.commit()
+        return self.db
+
+    async def close(self):
+        if self.db:
+            await self.db.close()
+            self.db = None
+
+    @staticmethod
+    def cache_key(payload: Dict) -> str:
+        """Hash of the full request payload (model, temperature, max_tokens, messages)"""
+        # Stays on the json module so keys written by earlier versions still match
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def get(self, key: str, ttl: int) -> Optional[str]:
+        try:
+            db = await self.connect()
+            async with db.execute(
+                "SELECT body FROM resp WHERE key = ? AND ts > ?",
+                (key, int(time.time()) - ttl)
+            ) as cursor:
+                row = await cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.warning(f"Cache lookup failed: {str(e)}")
+            return None
+
+    async def set(self, key: str, body: str, category: Optional[str] = None):
+        try:
+            db = await self.connect()
+            now = int(time.time())
+            await db.execute("DELETE FROM resp WHERE ts < ?", (now - RESPONSE_CACHE_RETENTION,))
+            await db.execute(
+                "INSERT OR REPLACE INTO resp (key, body, ts, category) VALUES (?, ?, ?, ?)",
+                (key, body, now, category)
+            )
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Cache write failed: {str(e)}")
+
+    async def invalidate_category(self, category: str):
+        """Drop every cached response for a fund house (maintenance hook, not called by the API)"""
+        try:
+            db = await self.connect()
+            await db.execute("DELETE FROM resp WHERE category = ?", (category,))
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed: {str(e)}")
+
+class TaskStore:
+    """Status and results of background analyses, shared across workers via SQLite"""
+
+    def __init__(self, path: str = CACHE_DB_PATH):
+        self.path = path
+        self.db = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._lock:
+            if self.db is None:
+                self.db = await connect_cache_db(self.path)
+                await self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, fund_name TEXT, "
+                    "status TEXT, result TEXT, ts INTEGER)"
+                )
+                await self.db.commit()
+        return self.db
+
+    async def close(self):
+        if self.db:
+            await self.db.close()
+            self.db = None
+
+    async def create(self, task_id: str, fund_name: str):
+        db = await self.connect()
+        await db.execute("DELETE FROM tasks WHERE ts < ?", (int(time.time()) - TASK_RETENTION,))
+        await db.execute(
+            "INSERT INTO tasks (id, fund_name, status, result, ts) VALUES (?, ?, 'queued', NULL, ?)",
+            (task_id, fund_name, int(time.time()))
+        )
+        await db.commit()
+
+    async def update(self, task_id: str, status: str, result: Optional[Dict] = None):
+        db = await self.connect()
+        await db.execute(
+            "UPDATE tasks SET status = ?, result = ?, ts = ? WHERE id = ?",
+            (status, orjson.dumps(result).decode() if result is not None else None, int(time.time()), task_id)
+        )
+        await db.commit()
+
+    async def get(self, task_id: str) -> Optional[Dict]:
+        db = await self.connect()
+        async with db.execute(
+            "SELECT fund_name, status, result, ts FROM tasks WHERE id = ?", (task_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            "task_id": task_id,
+            "fund_name": row[0],
+            "status": row[1],
+            "result": orjson.loads(row[2]) if row[2] else None,
+            "updated_at": datetime.fromtimestamp(row[3]).isoformat()
+        }
+
+class SemanticCache:
+    """Embedding cache of full analysis results for near-duplicate fund names"""
+
+    def __init__(self, path: str = CACHE_DB_PATH, model_name: str = EMBEDDING_MODEL):
+        self.path = path
+        self.model_name = model_name
+        self.namespace = f"{PERPLEXITY_MODEL}:{model_name}:v{CACHE_VERSION}"
+        self.db = None
+        self.model = None
+        self.enabled = True
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._lock:
+            if self.db is None:
+                db = await connect_cache_db(self.path)
+                try:
+                    await db.enable_load_extension(True)
+                    await db.load_extension(sqlite_vec.loadable_path())
+                    await db.enable_load_extension(False)
+                    await db.execute(
+                        "CREATE TABLE IF NOT EXISTS funds (id INTEGER PRIMARY KEY, namespace TEXT, "
+                        "fund_name TEXT, embedding BLOB, analysis TEXT, ts INTEGER, category TEXT)"
+                    )
+                    await ensure_column(db, "funds", "category", "TEXT")
+                    await ensure_column(db, "funds", "variant", "TEXT")
+                    await ensure_column(db, "funds", "name_key", "TEXT")
+                    await db.execute("CREATE INDEX IF NOT EXISTS funds_namespace_ts ON funds (namespace, ts)")
+                    await db.execute("CREATE INDEX IF NOT EXISTS funds_ts ON funds (ts)")
+                    await db.execute(
+                        "CREATE UNIQUE INDEX IF NOT EXISTS funds_namespace_name ON funds (namespace, name_key)"
+                    )
+                    await db.commit()
+                except Exception:
+                    # Don't leave the aiosqlite thread running behind a half-opened connection
+                    await db.close()
+                    raise
+                self.db = db
+            if self.model is None:
+                # Loading the model is slow and CPU-bound, keep it off the event loop
+                self.model = await asyncio.to_thread(SentenceTransformer, self.model_name)
+        return self.db
+
+    async def close(self):
+        if self.db:
+            await self.db.close()
+            self.db = None
+
+    async def embed(self, fund_name: str) -> Optional[bytes]:
+        """Embed the base fund name, or None if the cache is unavailable"""
+        if not self.enabled:
+            return None
+        try:
+            await self.connect()
+        except Exception as e:
+            # Don't retry a failed model/extension load on every request
+            logger.error(f"Semantic cache disabled: {str(e)}")
+            self.enabled = False
+            return None
+        try:
+            vector = await asyncio.to_thread(
+                self.model.encode, split_fund_variant(fund_name)[0], normalize_embeddings=True
+            )
+            return sqlite_vec.serialize_float32(vector.tolist())
+        except Exception as e:
+            logger.warning(f"Fund name embedding failed: {str(e)}")
+            return None
+
+    async def get(self, fund_name: str, embedding: bytes, ttl: int = SEMANTIC_CACHE_TTL) -> Optional[Dict]:
+        """Closest cached analysis of the same plan/option, if near enough
+        
+        A name without a plan/option matches any variant, preferring DEFAULT_FUND_VARIANT.
+        """
+        variant = split_fund_variant(fund_name)[1]
+        try:
+            db = await self.connect()
+            async with db.execute(
+                "SELECT fund_name, analysis, vec_distance_cosine(embedding, ?) AS distance FROM funds "
+                "WHERE namespace = ? AND variant IS NOT NULL AND (? = '' OR variant = ?) AND ts > ? "
+                "ORDER BY distance, variant != ? LIMIT 1",
+                (embedding, self.namespace, variant, variant, int(time.time()) - ttl, DEFAULT_FUND_VARIANT)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row and row[2] < SEMANTIC_CACHE_MAX_DISTANCE:
+                logger.info(f"Semantic cache hit: {row[0]} (distance {row[2]:.3f})")
+                return orjson.loads(row[1])
+            return None
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {str(e)}")
+            return None
+
+    async def set(self, fund_name: str, embedding: bytes, analysis: Dict):
+        """Store an analysis, replacing any earlier one for the same fund and dropping expired rows"""
+        base, variant = split_fund_variant(fund_name)
+        try:
+            db = await self.connect()
+            now = int(time.time())
+            await db.execute("DELETE FROM funds WHERE ts < ?", (now - SEMANTIC_CACHE_TTL,))
+            await db.execute(
+                "INSERT INTO funds (namespace, fund_name, embedding, analysis, ts, category, variant, name_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (namespace, name_key) DO UPDATE SET "
+                "fund_name = excluded.fund_name, embedding = excluded.embedding, "
+                "analysis = excluded.analysis, ts = excluded.ts",
+                (self.namespace, fund_name, embedding, orjson.dumps(analysis).decode(), now,
+                 fund_category(fund_name), variant, f"{base}|{variant}")
+            )
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Semantic cache write failed: {str(e)}")
+
+    async def invalidate_category(self, category: str):
+        """Drop every cached analysis for a fund house (maintenance hook, not called by the API)"""
+        try:
+            db = await self.connect()
+            await db.execute("DELETE FROM funds WHERE category = ?", (category,))
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Semantic cache invalidation failed: {str(e)}")
+
 class MutualFundAnalyzer:
     def __init__(self):
         self.session = None
         self.request_count = 0
+        self.headers = {
+            "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        self.cache = LLMCache()
+        self.semantic_cache = SemanticCache()
+        # Keyed by (base fund name, plan/option) and use_cache, so word order doesn't split runs
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._inflight_lock = asyncio.Lock()
+        # Bounds outbound calls so bursts don't trip the Perplexity rate limit
+        self._sem = asyncio.Semaphore(PERPLEXITY_CONCURRENCY)
     
     async def get_session(self):
-        if self.session is None:
+        if self.session is None or self.session.closed:
             timeout = aiohttp.ClientTimeout(total=300)  # 5 minutes timeout
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            # Pooled keep-alive connections so calls to Perplexity skip the TCP/TLS handshake
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=32,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
         return self.session
     
     async def close_session(self):
@@ -77,177 +548,431 @@ class MutualFundAnalyzer:
             await self.session.close()
             self.session = None
     
-    async def call_perplexity_api(self, prompt: str, role: str = "assistant") -> str:
-        """Make API call to Perplexity with error handling"""
-        session = await self.get_session()
-        
-        headers = {
-            "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
-            "Content-Type": "application/json"
-        }
+    @staticmethod
+    def _build_payload(prompt: str, system_prompt: Optional[str] = None,
+                       max_tokens: int = SECTION_MAX_TOKENS, response_format: Optional[Dict] = None) -> Dict:
+        messages = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
         
         payload = {
-            "model": "sonar",
-            "messages": [
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
+            "model": PERPLEXITY_MODEL,
+            "messages": messages,
             "temperature": 0.2,
-            "max_tokens": 2000
+            "max_tokens": max_tokens
         }
+        if response_format:
+            payload["response_format"] = response_format
+        return payload
+    
+    async def call_perplexity_api(self, prompt: str, role: str = "assistant",
+                                  system_prompt: Optional[str] = None,
+                                  ttl: int = FUND_CACHE_TTL, use_cache: bool = True,
+                                  max_tokens: int = SECTION_MAX_TOKENS, response_format: Optional[Dict] = None,
+                                  cacheable: bool = True, category: Optional[str] = None,
+                                  validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Make API call to Perplexity with error handling and response caching
+        
+        Only side-effect-free retrieval calls may be cached; pass cacheable=False for
+        calls that act on state so they are never served from or admitted to the cache.
+        Every agent call today is retrieval, so nothing in this module passes it yet.
+        use_cache=False skips the lookup but still refreshes the cached response.
+        validate, if given, must accept the content before it is cached.
+        """
+        
+        payload = self._build_payload(prompt, system_prompt, max_tokens, response_format)
+        
+        cache_key = self.cache.cache_key(payload)
+        if use_cache and cacheable:
+            cached = await self.cache.get(cache_key, ttl)
+            if cached is not None:
+                logger.info("Perplexity response served from cache")
+                return cached
         
         try:
+            result = await self._post_completion(payload)
+            content = result['choices'][0]['message']['content']
+            if cacheable and (validate is None or validate(content)):
+                await self.cache.set(cache_key, content, category=category)
+            return content
+        except PerplexityAPIError as e:
+            logger.error(f"Perplexity API error: {str(e)}")
+            return API_ERROR_MESSAGE.format(status=e.status)
+        except asyncio.TimeoutError:
+            logger.error("Perplexity API timeout")
+            return TIMEOUT_MESSAGE
+        except Exception as e:
+            logger.error(f"Exception calling Perplexity API: {str(e)}")
+            return UNAVAILABLE_MESSAGE
+    
+    @retry_on_rate_limit
+    async def _post_completion(self, payload: Dict) -> Dict:
+        session = await self.get_session()
+        async with self._sem:
             self.request_count += 1
             logger.info(f"Making Perplexity API call #{self.request_count}")
             
-            async with session.post(PERPLEXITY_BASE_URL, json=payload, headers=headers) as response:
+            async with session.post(PERPLEXITY_BASE_URL, json=payload) as response:
                 if response.status == 200:
-                    result = await response.json()
-                    return result['choices'][0]['message']['content']
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Perplexity API error: {response.status} - {error_text}")
-                    return f"Error calling Perplexity API: {response.status}. Please try again."
-        except asyncio.TimeoutError:
+                    return orjson.loads(await response.read())
+                raise_for_perplexity_status(response.status, await response.text())
+    
+    @retry_on_rate_limit
+    async def _open_stream(self, payload: Dict) -> aiohttp.ClientResponse:
+        """Open a streaming completion holding a concurrency slot; the caller releases it with the response"""
+        session = await self.get_session()
+        # Taken per attempt so backoff sleeps between retries don't hold a slot
+        await self._sem.acquire()
+        try:
+            self.request_count += 1
+            logger.info(f"Making streaming Perplexity API call #{self.request_count}")
+            
+            response = await session.post(PERPLEXITY_BASE_URL, json={**payload, "stream": True})
+            if response.status != 200:
+                error_text = await response.text()
+                response.release()
+                raise_for_perplexity_status(response.status, error_text)
+            return response
+        except BaseException:
+            self._sem.release()
+            raise
+    
+    async def stream_perplexity_api(self, prompt: str, system_prompt: Optional[str] = None,
+                                    ttl: int = FUND_CACHE_TTL, use_cache: bool = True,
+                                    max_tokens: int = SECTION_MAX_TOKENS, cacheable: bool = True,
+                                    category: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream a Perplexity completion as it is generated, sharing the response cache
+        
+        Raises StreamInterruptedError if the call fails or the stream ends before [DONE]
+        or a finish_reason, possibly after some deltas were yielded. Only completed streams are cached.
+        """
+        payload = self._build_payload(prompt, system_prompt, max_tokens)
+        
+        # Keyed without the stream flag so streamed and buffered calls share entries
+        cache_key = self.cache.cache_key(payload)
+        if use_cache and cacheable:
+            cached = await self.cache.get(cache_key, ttl)
+            if cached is not None:
+                logger.info("Perplexity response served from cache")
+                yield cached
+                return
+        
+        chunks = []
+        completed = False
+        
+        try:
+            response = await self._open_stream(payload)
+            # The slot is held for the whole stream, not just the initial request
+            try:
+                async with response:
+                    # Server-sent events: one "data: {...}" line per chunk; the last chunk carries a
+                    # finish_reason, usually followed by "data: [DONE]"
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            completed = True
+                            break
+                        choice = orjson.loads(data)['choices'][0]
+                        delta = choice.get('delta', {}).get('content')
+                        if delta:
+                            chunks.append(delta)
+                            yield delta
+                        # Some streams end on the last chunk's finish_reason without sending [DONE]
+                        if choice.get('finish_reason') is not None:
+                            completed = True
+                            break
+            finally:
+                self._sem.release()
+        except PerplexityAPIError as e:
+            logger.error(f"Perplexity API error: {str(e)}")
+            raise StreamInterruptedError(API_ERROR_MESSAGE.format(status=e.status)) from e
+        except asyncio.TimeoutError as e:
             logger.error("Perplexity API timeout")
-            return "Request timeout. Please try again with a shorter fund name."
+            raise StreamInterruptedError(TIMEOUT_MESSAGE) from e
         except Exception as e:
-            logger.error(f"Exception calling Perplexity API: {str(e)}")
-            return f"Service temporarily unavailable. Please try again later."
+            logger.error(f"Exception streaming Perplexity API: {str(e)}")
+            raise StreamInterruptedError(UNAVAILABLE_MESSAGE) from e
+        
+        if not completed:
+            logger.error("Perplexity stream ended before it finished")
+            raise StreamInterruptedError(UNAVAILABLE_MESSAGE)
+        
+        if cacheable and chunks:
+            await self.cache.set(cache_key, "".join(chunks), category=category)
     
-    async def analyze_mutual_fund(self, fund_name: str) -> str:
+    async def analyze_mutual_fund(self, fund_name: str, use_cache: bool = True) -> str:
         """Mutual Fund Analysis Agent"""
-        prompt = f"""
-        As an expert Mutual Fund Analyst specializing in Indian mutual funds, provide a comprehensive analysis of {fund_name}.
-
-        Please analyze:
-        1. Fund Overview (AUM, expense ratio, fund manager, investment style)
-        2. Historical Performance (1Y, 3Y, 5Y returns vs benchmark and category)
-        3. Portfolio Analysis (top holdings, sector allocation, market cap distribution)
-        4. Risk Metrics (beta, standard deviation, Sharpe ratio)
-        5. Fund Manager track record
-        6. Strengths and weaknesses
-        7. Suitability for different investor profiles
-
-        Provide specific data points and numbers wherever possible. Focus on recent data from the last 12 months.
-        """
-        
-        return await self.call_perplexity_api(prompt)
+        return await self.call_perplexity_api(
+            FUND_PROMPT.format(fund_name=fund_name), system_prompt=FUND_ANALYSIS_INSTRUCTIONS,
+            use_cache=use_cache, category=fund_category(fund_name)
+        )
     
-    async def analyze_sentiment(self, fund_name: str) -> str:
+    async def analyze_sentiment(self, fund_name: str, use_cache: bool = True) -> str:
         """Financial Sentiment Analysis Agent"""
-        prompt = f"""
-        As a Financial Sentiment Analysis expert, analyze the current market sentiment around {fund_name}.
-
-        Research and analyze:
-        1. Recent news articles and press releases (last 4 weeks)
-        2. Expert commentary and analyst recommendations
-        3. Social media sentiment from financial platforms
-        4. Any significant events affecting the fund or its holdings
-        5. Investor sentiment trends
-        6. Media coverage tone (positive/neutral/negative)
-
-        Provide:
-        - Overall sentiment score and direction
-        - Key positive and negative catalysts
-        - Recent events impact
-        - Forward-looking sentiment indicators
-
-        Focus on credible financial news sources and expert opinions.
-        """
-        
-        return await self.call_perplexity_api(prompt)
+        return await self.call_perplexity_api(
+            FUND_PROMPT.format(fund_name=fund_name), system_prompt=SENTIMENT_ANALYSIS_INSTRUCTIONS,
+            use_cache=use_cache, category=fund_category(fund_name)
+        )
     
-    async def analyze_macroeconomic(self, fund_name: str) -> str:
+    async def analyze_macroeconomic(self, fund_name: str, use_cache: bool = True) -> str:
         """Macroeconomic Analysis Agent"""
-        prompt = f"""
-        As a Macroeconomic Analysis expert, analyze how current macroeconomic conditions impact {fund_name}.
-
-        Analyze current economic indicators:
-        1. India's GDP growth trends and forecasts
-        2. RBI monetary policy and interest rate outlook
-        3. Inflation trends (CPI, WPI) and impact
-        4. Global economic factors affecting Indian markets
-        5. Currency trends (INR/USD) and FII flows
-        6. Government policies affecting mutual funds/capital markets
-        7. Sectoral economic trends relevant to the fund's holdings
-
-        Provide:
-        - Current economic environment summary
-        - Key macroeconomic risks and opportunities
-        - Specific implications for the fund's performance
-        - Forward-looking economic scenarios
-        - Policy changes that could impact the fund
-
-        Focus on recent data and RBI/government announcements.
-        """
-        
-        return await self.call_perplexity_api(prompt)
+        return await self.call_perplexity_api(
+            FUND_PROMPT.format(fund_name=fund_name), system_prompt=MACRO_ANALYSIS_INSTRUCTIONS,
+            ttl=MACRO_CACHE_TTL, use_cache=use_cache, category=fund_category(fund_name)
+        )
     
-    async def compile_final_report(self, fund_name: str, fund_analysis: str, sentiment_analysis: str, macro_analysis: str) -> str:
+    async def compile_final_report(self, fund_name: str, fund_analysis: str, sentiment_analysis: str, macro_analysis: str,
+                                   use_cache: bool = True) -> str:
         """Research Report Compilation Agent"""
-        prompt = f"""
-        As an expert Research Report Writer, compile a comprehensive investment research report for {fund_name} using the following analyses:
-
-        FUND ANALYSIS:
-        {fund_analysis}
-
-        SENTIMENT ANALYSIS:
-        {sentiment_analysis}
-
-        MACROECONOMIC ANALYSIS:
-        {macro_analysis}
-
-        Create a professional research report with the following structure:
-
-        # Investment Research Report: {fund_name}
+        prompt = self._report_prompt(fund_name, fund_analysis, sentiment_analysis, macro_analysis)
+        
+        return await self.call_perplexity_api(
+            prompt, system_prompt=REPORT_INSTRUCTIONS, use_cache=use_cache, category=fund_category(fund_name),
+            max_tokens=REPORT_MAX_TOKENS
+        )
+    
+    def stream_final_report(self, fund_name: str, fund_analysis: str, sentiment_analysis: str, macro_analysis: str,
+                            use_cache: bool = True) -> AsyncIterator[str]:
+        """Research Report Compilation Agent, streamed"""
+        prompt = self._report_prompt(fund_name, fund_analysis, sentiment_analysis, macro_analysis)
+        
+        return self.stream_perplexity_api(
+            prompt, system_prompt=REPORT_INSTRUCTIONS, use_cache=use_cache, category=fund_category(fund_name),
+            max_tokens=REPORT_MAX_TOKENS
+        )
+    
+    @staticmethod
+    def _report_prompt(fund_name: str, fund_analysis: str, sentiment_analysis: str, macro_analysis: str) -> str:
+        return REPORT_PROMPT.format(
+            fund_name=fund_name,
+            fund_analysis=fund_analysis,
+            sentiment_analysis=sentiment_analysis,
+            macro_analysis=macro_analysis
+        )
+    
+    async def run_analysis(self, fund_name: str, use_cache: bool = True) -> Dict:
+        """Run the full analysis pipeline, sharing one in-flight run between concurrent callers"""
+        key = (split_fund_variant(fund_name), use_cache)
+        async with self._inflight_lock:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._run_cached_analysis(fund_name, use_cache=use_cache))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                logger.info(f"Joining in-flight analysis for: {fund_name}")
+        
+        # Shielded so a disconnecting client doesn't cancel the run other callers are waiting on
+        return await asyncio.shield(task)
+    
+    async def _run_cached_analysis(self, fund_name: str, use_cache: bool = True) -> Dict:
+        """Run the full analysis pipeline, reusing results for near-duplicate fund names"""
+        embedding = await self.semantic_cache.embed(fund_name)
+        if use_cache and embedding is not None:
+            cached = await self.semantic_cache.get(fund_name, embedding)
+            if cached is not None:
+                return cached
+        
+        analysis_result = await self._run_pipeline(fund_name, use_cache=use_cache)
+        
+        # Only remember complete analyses so a transient API failure isn't served for a day
+        if embedding is not None and not any(is_failed_response(v) for v in analysis_result.values()):
+            await self.semantic_cache.set(fund_name, embedding, analysis_result)
+        
+        return analysis_result
+    
+    async def analyze_fused(self, fund_name: str, use_cache: bool = True) -> Optional[Dict]:
+        """All four agents in a single Perplexity call returning structured JSON"""
+        content = await self.call_perplexity_api(
+            FUND_PROMPT.format(fund_name=fund_name), system_prompt=FUSED_ANALYSIS_INSTRUCTIONS,
+            ttl=MACRO_CACHE_TTL, use_cache=use_cache, category=fund_category(fund_name),
+            max_tokens=FUSED_MAX_TOKENS, response_format=FUSED_RESPONSE_FORMAT,
+            # A truncated or malformed reply must not be cached, or every run would refetch the sections
+            validate=lambda content: parse_fused_analysis(content) is not None
+        )
+        
+        if is_failed_response(content):
+            return {
+                "fund_analysis": content,
+                "sentiment_analysis": content,
+                "macroeconomic_analysis": content,
+                "final_report": content
+            }
+        
+        analysis_result = parse_fused_analysis(content)
+        if analysis_result is None:
+            logger.warning(f"Could not parse fused analysis for {fund_name}")
+        return analysis_result
+    
+    async def _run_pipeline(self, fund_name: str, use_cache: bool = True) -> Dict:
+        """Run the Perplexity analyses for a fund, one call when the fused response parses"""
+        analysis_result = await self.analyze_fused(fund_name, use_cache=use_cache)
+        if analysis_result is not None:
+            return analysis_result
+        
+        logger.info(f"Falling back to separate analysis calls for: {fund_name}")
+        # Run all analyses concurrently
+        tasks = [
+            self.analyze_mutual_fund(fund_name, use_cache=use_cache),
+            self.analyze_sentiment(fund_name, use_cache=use_cache),
+            self.analyze_macroeconomic(fund_name, use_cache=use_cache)
+        ]
+        
+        # Execute all analyses in parallel
+        fund_analysis, sentiment_analysis, macro_analysis = await asyncio.gather(*tasks)
+        
+        # Generate final report
+        final_report = await self.compile_final_report(
+            fund_name, fund_analysis, sentiment_analysis, macro_analysis, use_cache=use_cache
+        )
+        
+        return {
+            "fund_analysis": fund_analysis,
+            "sentiment_analysis": sentiment_analysis,
+            "macroeconomic_analysis": macro_analysis,
+            "final_report": final_report
+        }
 
-        ## Executive Summary
-        - Key findings and investment recommendation
-        - Target investor profile
-        - Risk rating
+    async def stream_analysis(self, fund_name: str, use_cache: bool = True) -> AsyncIterator[Dict]:
+        """Run the analysis pipeline, yielding each section as soon as it is ready
+        
+        Yields "section" events for the three analyses, "report_delta" events while
+        the final report streams, and a final "done" event carrying the full analysis.
+        Shares the in-flight registry with run_analysis: a caller that joins a run
+        already in progress, streamed or not, gets every section once it is done.
+        """
+        key = (split_fund_variant(fund_name), use_cache)
+        events = None
+        async with self._inflight_lock:
+            task = self._inflight.get(key)
+            if task is None:
+                events = asyncio.Queue()
+                task = asyncio.ensure_future(self._run_streamed_analysis(fund_name, use_cache, events))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                logger.info(f"Joining in-flight analysis for: {fund_name}")
+        
+        if events is not None:
+            # The run is a task of its own, so a disconnecting client doesn't cancel it
+            while (event := await events.get()) is not None:
+                yield event
+        
+        analysis_result = await asyncio.shield(task)
+        if events is None:
+            for section, content in analysis_result.items():
+                yield {"event": "section", "section": section, "content": content}
+        yield {"event": "done", "analysis": analysis_result}
+    
+    async def _run_streamed_analysis(self, fund_name: str, use_cache: bool, events: asyncio.Queue) -> Dict:
+        """Streaming pipeline run, publishing events to the queue and returning the full analysis
+        
+        Uses the separate agent calls rather than the fused one, since a single JSON
+        object can't be shown until it is complete.
+        """
+        try:
+            embedding = await self.semantic_cache.embed(fund_name)
+            if use_cache and embedding is not None:
+                cached = await self.semantic_cache.get(fund_name, embedding)
+                if cached is not None:
+                    for section, content in cached.items():
+                        events.put_nowait({"event": "section", "section": section, "content": content})
+                    return cached
+            
+            async def run_section(section: str, coro):
+                return section, await coro
+            
+            sections = {}
+            for next_section in asyncio.as_completed([
+                run_section("fund_analysis", self.analyze_mutual_fund(fund_name, use_cache=use_cache)),
+                run_section("sentiment_analysis", self.analyze_sentiment(fund_name, use_cache=use_cache)),
+                run_section("macroeconomic_analysis", self.analyze_macroeconomic(fund_name, use_cache=use_cache))
+            ]):
+                section, content = await next_section
+                sections[section] = content
+                events.put_nowait({"event": "section", "section": section, "content": content})
+            
+            report_chunks = []
+            try:
+                async for delta in self.stream_final_report(
+                    fund_name, sections["fund_analysis"], sections["sentiment_analysis"],
+                    sections["macroeconomic_analysis"], use_cache=use_cache
+                ):
+                    report_chunks.append(delta)
+                    events.put_nowait({"event": "report_delta", "content": delta})
+                final_report = "".join(report_chunks)
+            except StreamInterruptedError as e:
+                # A partial report isn't kept; it is replaced by the failure message, which
+                # also keeps the result out of the semantic cache
+                final_report = str(e)
+                events.put_nowait({"event": "report_delta", "content": ("\n\n" if report_chunks else "") + final_report})
+            
+            analysis_result = {
+                "fund_analysis": sections["fund_analysis"],
+                "sentiment_analysis": sections["sentiment_analysis"],
+                "macroeconomic_analysis": sections["macroeconomic_analysis"],
+                "final_report": final_report
+            }
+            
+            if embedding is not None and not any(is_failed_response(v) for v in analysis_result.values()):
+                await self.semantic_cache.set(fund_name, embedding, analysis_result)
+            
+            return analysis_result
+        finally:
+            events.put_nowait(None)
 
-        ## Fund Overview
-        - Basic fund details and strategy
+class CachedClock:
+    """ISO timestamp refreshed once a second, so hot paths don't format a datetime per request"""
 
-        ## Performance Analysis
-        - Historical performance summary
-        - Risk-adjusted returns
+    def __init__(self):
+        self._now = datetime.now().isoformat()
+        self._task = None
 
-        ## Current Market Environment
-        - Macroeconomic backdrop
-        - Market sentiment
+    async def _tick(self):
+        while True:
+            self._now = datetime.now().isoformat()
+            await asyncio.sleep(1)
 
-        ## Investment Thesis
-        - Strengths and opportunities
-        - Risks and challenges
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._tick())
 
-        ## Final Recommendation
-        - Investment rating (BUY/HOLD/SELL)
-        - Rationale for recommendation
-        - Suitable investor profile
-        - Investment horizon
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
 
-        Use professional investment research language and provide specific, actionable insights.
-        """
-        
-        return await self.call_perplexity_api(prompt)
+    def now(self) -> str:
+        # Fall back to the real time when the ticker isn't running (e.g. before startup)
+        return self._now if self._task else datetime.now().isoformat()
 
 # Global analyzer instance
 analyzer = MutualFundAnalyzer()
+task_store = TaskStore()
+clock = CachedClock()
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize resources on startup"""
+    clock.start()
     logger.info("Starting Mutual Fund Analysis API")
     logger.info(f"Perplexity API Key configured: {'Yes' if PERPLEXITY_API_KEY else 'No'}")
+    # Open the shared HTTP session now; it stays open until shutdown
+    await analyzer.get_session()
+    # Load the embedding model up front so the first request doesn't pay for it
+    await analyzer.semantic_cache.embed("warmup")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup resources on shutdown"""
     await analyzer.close_session()
+    await analyzer.cache.close()
+    await analyzer.semantic_cache.close()
+    await task_store.close()
+    await clock.stop()
     logger.info("Shutting down Mutual Fund Analysis API")
 
 @app.get("/", response_model=Dict)
@@ -256,7 +981,7 @@ async def root():
     return {
         "message": "Mutual Fund Analysis API", 
         "status": "active",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": clock.now(),
         "docs": "/docs",
         "health": "/health"
     }
@@ -267,56 +992,76 @@ async def health_check():
     return HealthResponse(
         status="healthy",
         service="Mutual Fund Analysis API",
-        timestamp=datetime.now().isoformat(),
+        timestamp=clock.now(),
         version="1.0.0"
     )
 
+def analysis_etag(analysis_result: Dict) -> str:
+    """Weak ETag over the analysis content, so it changes whenever the cached result does
+
+    Weak because the response body also carries the request's fund name and timestamp,
+    which can differ between two responses with the same analysis.
+    """
+    body = orjson.dumps(analysis_result, option=orjson.OPT_SORT_KEYS)
+    return 'W/"' + hashlib.sha256(CACHE_VERSION.encode() + b":" + body).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110 section 13.1.2)"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+async def run_conditional_analysis(fund_name: str, use_cache: bool, http_request: Request, response: Response):
+    """Shared body of GET and POST /analyze, with ETag and Cache-Control handling"""
+    fund_name = fund_name.strip()
+    
+    if not fund_name:
+        raise HTTPException(status_code=400, detail="Mutual fund name is required")
+    
+    if len(fund_name) < 3:
+        raise HTTPException(status_code=400, detail="Fund name too short. Please provide the complete fund name.")
+    
+    logger.info(f"Starting analysis for: {fund_name}")
+    
+    analysis_result = await analyzer.run_analysis(fund_name, use_cache=use_cache)
+    
+    logger.info(f"Analysis completed for: {fund_name}")
+    
+    etag = analysis_etag(analysis_result)
+    if any(is_failed_response(v) for v in analysis_result.values()):
+        cache_control = "no-store"
+    else:
+        # Fixed lifetime: the analysis may already be up to SEMANTIC_CACHE_TTL old when served
+        # from the semantic cache, so a client can hold it for up to a day plus this hour
+        cache_control = "public, max-age=3600"
+    
+    # Clients already holding this analysis skip the body transfer. Only GET/HEAD may
+    # answer 304; other methods must fail the precondition with 412.
+    if etag_matches(http_request.headers.get("if-none-match", ""), etag):
+        if http_request.method in ("GET", "HEAD"):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+        return ORJSONResponse(
+            status_code=412, content={"detail": "Analysis unchanged"},
+            headers={"ETag": etag, "Cache-Control": "no-store"}
+        )
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    
+    return AnalysisResponse(
+        status="success",
+        fund_name=fund_name,
+        analysis=analysis_result,
+        timestamp=clock.now()
+    )
+
 @app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_mutual_fund(request: MutualFundRequest):
+async def analyze_mutual_fund(request: MutualFundRequest, http_request: Request, response: Response):
     """
     Analyze a mutual fund and generate comprehensive report
     """
     try:
-        fund_name = request.mutual_fund_name.strip()
-        
-        if not fund_name:
-            raise HTTPException(status_code=400, detail="Mutual fund name is required")
-        
-        if len(fund_name) < 3:
-            raise HTTPException(status_code=400, detail="Fund name too short. Please provide the complete fund name.")
-        
-        logger.info(f"Starting analysis for: {fund_name}")
-        
-        # Run all analyses concurrently
-        tasks = [
-            analyzer.analyze_mutual_fund(fund_name),
-            analyzer.analyze_sentiment(fund_name),
-            analyzer.analyze_macroeconomic(fund_name)
-        ]
-        
-        # Execute all analyses in parallel
-        fund_analysis, sentiment_analysis, macro_analysis = await asyncio.gather(*tasks)
-        
-        # Generate final report
-        final_report = await analyzer.compile_final_report(
-            fund_name, fund_analysis, sentiment_analysis, macro_analysis
-        )
-        
-        # Compile response
-        analysis_result = {
-            "fund_analysis": fund_analysis,
-            "sentiment_analysis": sentiment_analysis,
-            "macroeconomic_analysis": macro_analysis,
-            "final_report": final_report
-        }
-        
-        logger.info(f"Analysis completed for: {fund_name}")
-        
-        return AnalysisResponse(
-            status="success",
-            fund_name=fund_name,
-            analysis=analysis_result,
-            timestamp=datetime.now().isoformat()
+        return await run_conditional_analysis(
+            request.mutual_fund_name, not request.no_cache, http_request, response
         )
         
     except HTTPException:
@@ -325,6 +1070,34 @@ async def analyze_mutual_fund(request: MutualFundRequest):
         logger.error(f"Analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.post("/analyze-stream")
+async def analyze_mutual_fund_stream(request: MutualFundRequest):
+    """
+    Analyze a mutual fund, streaming sections as NDJSON while they are generated
+    """
+    fund_name = request.mutual_fund_name.strip()
+    
+    if not fund_name:
+        raise HTTPException(status_code=400, detail="Mutual fund name is required")
+    
+    if len(fund_name) < 3:
+        raise HTTPException(status_code=400, detail="Fund name too short. Please provide the complete fund name.")
+    
+    logger.info(f"Starting streaming analysis for: {fund_name}")
+    
+    async def events():
+        try:
+            async for event in analyzer.stream_analysis(fund_name, use_cache=not request.no_cache):
+                if event["event"] == "done":
+                    event.update(status="success", fund_name=fund_name, timestamp=clock.now())
+                    logger.info(f"Streaming analysis completed for: {fund_name}")
+                yield orjson.dumps(event) + b"\n"
+        except Exception as e:
+            logger.error(f"Streaming analysis failed: {str(e)}")
+            yield orjson.dumps({"event": "error", "detail": f"Analysis failed: {str(e)}"}) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.post("/analyze-async")
 async def analyze_mutual_fund_async(request: MutualFundRequest, background_tasks: BackgroundTasks):
     """
@@ -335,81 +1108,125 @@ async def analyze_mutual_fund_async(request: MutualFundRequest, background_tasks
     if not fund_name:
         raise HTTPException(status_code=400, detail="Mutual fund name is required")
     
-    # Generate a simple task ID
-    task_id = f"task_{int(datetime.now().timestamp())}"
+    # Unique task ID, recorded before the response so /status can be polled immediately
+    task_id = f"task_{uuid.uuid4().hex}"
+    await task_store.create(task_id, fund_name)
     
     # Add background task
-    background_tasks.add_task(run_background_analysis, fund_name, task_id)
+    background_tasks.add_task(run_background_analysis, fund_name, task_id, no_cache=request.no_cache)
     
     return {
         "status": "accepted",
         "task_id": task_id,
         "fund_name": fund_name,
-        "message": "Analysis started. Results will be processed in the background."
+        "status_url": f"/status/{task_id}",
+        "message": "Analysis started. Poll the status URL for the result."
     }
 
-async def run_background_analysis(fund_name: str, task_id: str):
+async def run_background_analysis(fund_name: str, task_id: str, no_cache: bool = False):
     """Background task for analysis"""
     logger.info(f"Background analysis started for {fund_name} (Task: {task_id})")
     
     try:
-        # Run the same analysis as the sync version
-        tasks = [
-            analyzer.analyze_mutual_fund(fund_name),
-            analyzer.analyze_sentiment(fund_name),
-            analyzer.analyze_macroeconomic(fund_name)
-        ]
-        
-        fund_analysis, sentiment_analysis, macro_analysis = await asyncio.gather(*tasks)
+        await task_store.update(task_id, "running")
         
-        final_report = await analyzer.compile_final_report(
-            fund_name, fund_analysis, sentiment_analysis, macro_analysis
-        )
+        # Run the same analysis as the sync version; no_cache forces a fresh run
+        analysis_result = await analyzer.run_analysis(fund_name, use_cache=not no_cache)
         
-        # In production, store results in database or cache
+        await task_store.update(task_id, "done", {
+            "status": "success",
+            "fund_name": fund_name,
+            "analysis": analysis_result,
+            "timestamp": clock.now()
+        })
         logger.info(f"Background analysis completed for {fund_name} (Task: {task_id})")
         
     except Exception as e:
         logger.error(f"Background analysis failed for {fund_name} (Task: {task_id}): {str(e)}")
+        try:
+            await task_store.update(task_id, "failed", {"detail": f"Analysis failed: {str(e)}"})
+        except Exception as store_error:
+            logger.error(f"Could not record failure for task {task_id}: {str(store_error)}")
 
-@app.get("/analyze")
-async def analyze_get_info():
-    """Information about the analyze endpoint"""
-    return {
-        "message": "This endpoint requires a POST request with JSON data",
-        "method": "POST",
-        "url": "/analyze",
-        "example_request": {
-            "mutual_fund_name": "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan"
-        },
-        "curl_example": 'curl -X POST "YOUR_PRODUCTION_URL/analyze" -H "Content-Type: application/json" -d \'{"mutual_fund_name": "HDFC Top 100 Fund"}\'',
-        "interactive_docs": "Visit /docs for interactive API testing"
+@app.get("/status/{task_id}")
+async def get_task_status(task_id: str):
+    """
+    Status of a background analysis: queued, running, done (with result) or failed
+    """
+    task = await task_store.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+# Static endpoint bodies, serialized once at import
+ANALYZE_INFO_JSON = orjson.dumps({
+    "message": "POST JSON data to this endpoint, or GET it with a mutual_fund_name query parameter",
+    "method": "POST",
+    "url": "/analyze",
+    "get_example": "/analyze?mutual_fund_name=HDFC%20Top%20100%20Fund",
+    "example_request": {
+        "mutual_fund_name": "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan"
+    },
+    "curl_example": 'curl -X POST "YOUR_PRODUCTION_URL/analyze" -H "Content-Type: application/json" -d \'{"mutual_fund_name": "HDFC Top 100 Fund"}\'',
+    "interactive_docs": "Visit /docs for interactive API testing"
+})
+
+EXAMPLE_JSON = orjson.dumps({
+    "example_request": {
+        "mutual_fund_name": "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan"
+    },
+    "popular_funds": [
+        "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan",
+        "SBI Small Cap Fund - Direct Plan - Growth",
+        "Axis Bluechip Fund - Direct Plan - Growth",
+        "Mirae Asset Large Cap Fund - Direct Plan - Growth",
+        "Parag Parikh Long Term Equity Fund - Direct Plan - Growth"
+    ],
+    "endpoints": {
+        "analyze": "POST /analyze - Synchronous analysis",
+        "analyze-get": "GET /analyze?mutual_fund_name=... - Synchronous analysis, cacheable with ETag/304",
+        "analyze-stream": "POST /analyze-stream - Streaming analysis (NDJSON)",
+        "analyze-async": "POST /analyze-async - Asynchronous analysis",
+        "status": "GET /status/{task_id} - Background analysis status and result",
+        "health": "GET /health - Service health check",
+        "docs": "GET /docs - Interactive API documentation"
     }
+})
+
+@app.get("/analyze", response_model=AnalysisResponse)
+@app.head("/analyze", include_in_schema=False)
+async def analyze_get(http_request: Request, response: Response,
+                      mutual_fund_name: Optional[str] = None, no_cache: bool = False):
+    """
+    Cacheable form of POST /analyze; without a fund name, describes the endpoint
+    """
+    if mutual_fund_name is None:
+        return Response(content=ANALYZE_INFO_JSON, media_type="application/json")
+    try:
+        return await run_conditional_analysis(mutual_fund_name, not no_cache, http_request, response)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Analysis failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.get("/example")
 async def get_example():
     """Get example request format"""
-    return {
-        "example_request": {
-            "mutual_fund_name": "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan"
-        },
-        "popular_funds": [
-            "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan",
-            "SBI Small Cap Fund - Direct Plan - Growth",
-            "Axis Bluechip Fund - Direct Plan - Growth",
-            "Mirae Asset Large Cap Fund - Direct Plan - Growth",
-            "Parag Parikh Long Term Equity Fund - Direct Plan - Growth"
-        ],
-        "endpoints": {
-            "analyze": "POST /analyze - Synchronous analysis",
-            "analyze-async": "POST /analyze-async - Asynchronous analysis",
-            "health": "GET /health - Service health check",
-            "docs": "GET /docs - Interactive API documentation"
-        }
-    }
+    return Response(content=EXAMPLE_JSON, media_type="application/json")
 
 # For local development
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # "auto" picks uvloop and httptools (from uvicorn[standard]) where they are installed,
+    # and falls back to asyncio/h11 on platforms without them such as Windows
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
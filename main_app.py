@@ -1,8 +1,7 @@
 import streamlit as st
-import requests
-import json
+import httpx
+import orjson
 from datetime import datetime
-import time
 import re
 
 # Page configuration
@@ -14,7 +13,7 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -79,42 +78,147 @@ st.markdown("""
         transform: translateY(-2px);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Configuration
 API_BASE_URL = "https://web-production-f508e.up.railway.app"  # Replace with your actual Railway URL
 
-def call_analysis_api(fund_name: str):
-    """Call the FastAPI analysis endpoint"""
+# Markdown cleanup patterns, compiled once instead of on every rerender
+_RE_BLANK = re.compile(r'\n\s*\n\s*\n')
+_RE_HDR = re.compile(r'(#{1,6})\s*(.+)')
+
+# Static page content, built once instead of on every rerender
+HEADER_HTML = '<h1 class="main-header">📈 Mutual Fund Analysis Platform</h1>'
+
+INTRO_HTML = """
+<div style="text-align: center; margin-bottom: 2rem; color: #666;">
+    Get comprehensive analysis of Indian mutual funds with AI-powered insights covering 
+    fund performance, market sentiment, and macroeconomic factors.
+</div>
+"""
+
+HOW_TO_USE_MD = """
+1. Enter the complete mutual fund name
+2. Click 'Analyze Fund' button
+3. Wait for the comprehensive analysis
+4. Review the detailed report sections
+"""
+
+EXAMPLE_FUNDS = [
+    "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan",
+    "SBI Small Cap Fund - Direct Plan - Growth",
+    "Axis Bluechip Fund - Direct Plan - Growth",
+    "Mirae Asset Large Cap Fund - Direct Plan - Growth",
+    "Parag Parikh Long Term Equity Fund - Direct Plan - Growth"
+]
+EXAMPLE_FUND_BUTTONS = [(f"📊 {fund.split('-')[0].strip()}", fund) for fund in EXAMPLE_FUNDS]
+
+TROUBLESHOOTING_MD = """
+**Common Issues and Solutions:**
+
+1. **Connection Error**: Make sure your FastAPI server is running:
+   ```bash
+   uvicorn main:app --reload
+   ```
+
+2. **Timeout Error**: The analysis takes time. Try with a shorter fund name or check your internet connection.
+
+3. **API Error**: Verify the API endpoint is working by visiting: http://127.0.0.1:8000/docs
+
+4. **Fund Name**: Ensure you're using the complete official fund name.
+"""
+
+FOOTER_HTML = """
+<div style="text-align: center; color: #666; padding: 1rem;">
+    🚀 Powered by AI | 📊 Real-time Analysis | 💡 Investment Intelligence
+    <br>
+    <small>This tool provides analysis for informational purposes only. Please consult with a financial advisor before making investment decisions.</small>
+</div>
+"""
+
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    """Shared HTTP client so keep-alive connections to the API are reused across reruns"""
+    return httpx.Client(
+        base_url=API_BASE_URL,
+        timeout=300,  # 5 minutes timeout
+        limits=httpx.Limits(max_keepalive_connections=10)
+    )
+
+# Progress messages for the sections streamed by /analyze-stream
+SECTION_STATUS = {
+    "fund_analysis": "🔍 Fund information gathered",
+    "sentiment_analysis": "📰 Market sentiment analyzed",
+    "macroeconomic_analysis": "🏛️ Macroeconomic factors evaluated"
+}
+
+def call_analysis_api(fund_name: str, progress_bar=None, status_text=None):
+    """Call the streaming FastAPI analysis endpoint, updating progress as sections arrive"""
+    result = {}
+    
+    def report_stream(lines):
+        completed = 0
+        for line in lines:
+            if not line:
+                continue
+            event = orjson.loads(line)
+            if event["event"] == "section":
+                completed += 1
+                if progress_bar is not None:
+                    progress_bar.progress(completed * 25)
+                if status_text is not None:
+                    status_text.text(SECTION_STATUS.get(event["section"], "📊 Compiling final report..."))
+            elif event["event"] == "report_delta":
+                if status_text is not None:
+                    status_text.text("📊 Compiling final report...")
+                yield event["content"]
+            elif event["event"] == "done":
+                result.update(event)
+            elif event["event"] == "error":
+                result["error"] = event["detail"]
+    
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/analyze",
-            json={"mutual_fund_name": fund_name},
-            timeout=300  # 5 minutes timeout
-        )
+        with get_http_client().stream(
+            "POST",
+            "/analyze-stream",
+            json={"mutual_fund_name": fund_name}
+        ) as response:
+            if response.status_code != 200:
+                response.read()
+                return None, f"API Error: {response.status_code} - {response.text}"
+            
+            # Show the final report as it is written, replaced by the full layout when done
+            report_preview = st.empty()
+            with report_preview.container():
+                st.write_stream(report_stream(response.iter_lines()))
+            report_preview.empty()
         
-        if response.status_code == 200:
-            return response.json(), None
-        else:
-            return None, f"API Error: {response.status_code} - {response.text}"
+        if "error" in result:
+            return None, f"API Error: {result['error']}"
+        if not result:
+            return None, "API Error: The analysis stream ended before the report was completed."
+        return result, None
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return None, f"Connection Error: Unable to connect to the API server at {API_BASE_URL}. Please ensure the FastAPI server is running."
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return None, "Timeout Error: The analysis is taking longer than expected. Please try again."
     except Exception as e:
         return None, f"Unexpected Error: {str(e)}"
 
+@st.cache_data(max_entries=64)
 def format_markdown_content(content: str) -> str:
     """Clean and format markdown content for better display"""
     if not content:
         return "No data available"
     
     # Clean up extra whitespace and line breaks
-    content = re.sub(r'\n\s*\n\s*\n', '\n\n', content.strip())
+    content = _RE_BLANK.sub('\n\n', content.strip())
     
     # Ensure proper spacing around headers
-    content = re.sub(r'(#{1,6})\s*(.+)', r'\1 \2', content)
+    content = _RE_HDR.sub(r'\1 \2', content)
     
     return content
 
@@ -174,14 +278,9 @@ def display_final_report(report_content: str):
 
 def main():
     # Header
-    st.markdown('<h1 class="main-header">📈 Mutual Fund Analysis Platform</h1>', unsafe_allow_html=True)
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
     
-    st.markdown("""
-    <div style="text-align: center; margin-bottom: 2rem; color: #666;">
-        Get comprehensive analysis of Indian mutual funds with AI-powered insights covering 
-        fund performance, market sentiment, and macroeconomic factors.
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(INTRO_HTML, unsafe_allow_html=True)
     
     # Sidebar for configuration
     with st.sidebar:
@@ -190,25 +289,12 @@ def main():
         st.info("Make sure your FastAPI server is running on the specified URL.")
         
         st.header("📖 How to Use")
-        st.markdown("""
-        1. Enter the complete mutual fund name
-        2. Click 'Analyze Fund' button
-        3. Wait for the comprehensive analysis
-        4. Review the detailed report sections
-        """)
+        st.markdown(HOW_TO_USE_MD)
         
         # Popular fund examples
         st.header("💡 Popular Funds")
-        example_funds = [
-            "HDFC Mid-Cap Opportunities Fund - Growth Option - Direct Plan",
-            "SBI Small Cap Fund - Direct Plan - Growth",
-            "Axis Bluechip Fund - Direct Plan - Growth",
-            "Mirae Asset Large Cap Fund - Direct Plan - Growth",
-            "Parag Parikh Long Term Equity Fund - Direct Plan - Growth"
-        ]
-        
-        for fund in example_funds:
-            if st.button(f"📊 {fund.split('-')[0].strip()}", key=fund):
+        for label, fund in EXAMPLE_FUND_BUTTONS:
+            if st.button(label, key=fund):
                 st.session_state['fund_name'] = fund
     
     # Main input section
@@ -243,31 +329,20 @@ def main():
     if analyze_button and fund_name.strip():
         st.markdown("---")
         
-        # Show loading message
-        with st.container():
-            st.markdown('<div class="loading-message">🔄 Analyzing your mutual fund... This may take 2-3 minutes.</div>', unsafe_allow_html=True)
-            
-            # Progress bar
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            # Simulate progress updates
-            for i in range(100):
-                progress_bar.progress(i + 1)
-                if i < 25:
-                    status_text.text("🔍 Gathering fund information...")
-                elif i < 50:
-                    status_text.text("📰 Analyzing market sentiment...")
-                elif i < 75:
-                    status_text.text("🏛️ Evaluating macroeconomic factors...")
-                else:
-                    status_text.text("📊 Compiling final report...")
-                time.sleep(0.05)  # Small delay for visual effect
-            
+        # Show loading message while the API works; cached analyses return immediately
+        loading_message = st.empty()
+        loading_message.markdown('<div class="loading-message">🔄 Analyzing your mutual fund... This may take 2-3 minutes.</div>', unsafe_allow_html=True)
+        
+        # Progress follows the sections as the API streams them back
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        status_text.text("🔍 Gathering fund information...")
+        
         # Call the API
-        result, error = call_analysis_api(fund_name)
+        result, error = call_analysis_api(fund_name, progress_bar, status_text)
         
         # Clear progress indicators
+        loading_message.empty()
         progress_bar.empty()
         status_text.empty()
         
@@ -276,20 +351,7 @@ def main():
             
             # Troubleshooting tips
             with st.expander("🛠️ Troubleshooting Tips"):
-                st.markdown("""
-                **Common Issues and Solutions:**
-                
-                1. **Connection Error**: Make sure your FastAPI server is running:
-                   ```bash
-                   uvicorn main:app --reload
-                   ```
-                
-                2. **Timeout Error**: The analysis takes time. Try with a shorter fund name or check your internet connection.
-                
-                3. **API Error**: Verify the API endpoint is working by visiting: http://127.0.0.1:8000/docs
-                
-                4. **Fund Name**: Ensure you're using the complete official fund name.
-                """)
+                st.markdown(TROUBLESHOOTING_MD)
         
         elif result and result.get('status') == 'success':
             # Success message
@@ -380,13 +442,7 @@ def main():
     
     # Footer
     st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #666; padding: 1rem;">
-        🚀 Powered by AI | 📊 Real-time Analysis | 💡 Investment Intelligence
-        <br>
-        <small>This tool provides analysis for informational purposes only. Please consult with a financial advisor before making investment decisions.</small>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()